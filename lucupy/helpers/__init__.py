@@ -1,35 +1,49 @@
 # Copyright (c) 2016-2024 Association of Universities for Research in Astronomy, Inc. (AURA)
 # For license information see LICENSE or https://opensource.org/licenses/BSD-3-Clause
 
-import bisect
+import math
+import re
+from collections import deque
 from collections.abc import Iterable
 from datetime import timedelta
 from enum import Enum
-from typing import List, Optional, Type
+from functools import lru_cache
+from typing import Callable, Final, List, Optional, Type, Union
 
 import astropy.units as u
 import numpy as np
 import numpy.typing as npt
 from astropy.time import Time, TimeDelta
 
+from ._jit import HAS_NUMBA, _angular_distance_scalar, _dms2deg, _hms2deg
+
+try:
+    import numexpr as ne
+except ImportError:
+    ne = None
+
 __all__ = [
     'search_list',
     'unique_list',
     'angular_distance',
+    'angular_distance_pairwise',
     'dms2deg',
     'dms2rad',
     'dmsstr2deg',
+    'dmsstr2deg_array',
     'first_nonzero_time',
     'flatten',
     'hms2deg',
     'hms2rad',
     'hmsstr2deg',
+    'hmsstr2deg_array',
     'is_contiguous',
     'lerp',
     'lerp_degrees',
     'lerp_enum',
     'lerp_radians',
     'round_minute',
+    'round_minute_jd',
     'str_to_bool',
     'standards_for_nir',
     'time_delta_astropy_to_minutes',
@@ -66,6 +80,10 @@ def is_contiguous(iterable: Iterable) -> bool:
     return np.all(diffs == 1)
 
 
+# numpy dtype kinds (bool, signed and unsigned int, float, complex) that flatten converts with tolist().
+_NUMERIC_KINDS: Final[str] = 'biufc'
+
+
 def flatten(lst):  # type: ignore
     """Flattens any iterable, no matter how irregular.
        Deliberately left untyped to allow for maximum type usage.
@@ -79,31 +97,93 @@ def flatten(lst):  # type: ignore
     Yields:
         Value of the iterable.
     """
-    for el in lst:
-        if isinstance(el, Iterable) and not isinstance(el, (str, bytes)):
-            yield from flatten(el)
+    # Numeric numpy arrays are flattened in one shot without inspecting their elements. Other dtypes (e.g. object,
+    # datetime64, or structured) go through the generic traversal so their elements keep their numpy types.
+    if isinstance(lst, np.ndarray) and lst.dtype.kind in _NUMERIC_KINDS:
+        yield from lst.ravel().tolist()
+        return
+
+    # Traverse iteratively with a stack of iterators to avoid a Python frame (and the recursion limit) per level.
+    stack = deque([iter(lst)])
+    while stack:
+        for el in stack[-1]:
+            if isinstance(el, (list, tuple)):
+                stack.append(iter(el))
+                break
+            if isinstance(el, np.ndarray) and el.dtype.kind in _NUMERIC_KINDS:
+                yield from el.ravel().tolist()
+            elif isinstance(el, Iterable) and not isinstance(el, (str, bytes)):
+                stack.append(iter(el))
+                break
+            else:
+                yield el
         else:
-            yield el
+            stack.pop()
+
+
+# Number of minutes in a day, and a tolerance (in minutes) to absorb the floating point error of a single float JD
+# in minutes, which is about 5e-7 minutes for current epochs.
+_MINUTES_PER_DAY: Final[float] = 1440.0
+_JD_MINUTE_EPSILON: Final[float] = 1e-6
+
+# Tolerance (in seconds) for round_minute: times within half a millisecond of a minute, i.e. on the minute at the
+# millisecond resolution of ISO strings, are considered to be on it. This absorbs the error of times built from
+# float JDs, which ymdhms shows as e.g. 59.999996 seconds.
+_SECOND_EPSILON: Final[float] = 5e-4
+
+
+def _truncate_minute(time: Time) -> Time:
+    """Set the seconds of time value(s) to zero, working on the calendar fields so that leap seconds are honoured."""
+    ymdhms = time.ymdhms
+    fields = {name: ymdhms[name] for name in ('year', 'month', 'day', 'hour', 'minute')}
+    fields['second'] = np.zeros_like(ymdhms['second'])
+    return Time(fields, format='ymdhms', scale=time.scale)
 
 
 def round_minute(time: Time, up: bool = False) -> Time:
     """Round a time down (truncate) or up to the nearest minute time: an astropy.Time
 
+    The rounding is done on the calendar fields of the time rather than on its Julian Date, since in UTC a day with
+    a leap second does not consist of 1440 equal minutes. No ISO formatting or parsing is involved.
+    Times within half a millisecond of a minute are considered to be on it.
+
     Args:
         time: times value(s) to round down/up
         up: bool indicating whether to round up
 
     Returns:
-        Round up/down value(s) on Astropy Time object
+        Round up/down value(s) on Astropy Time object, in the same scale as time
+    """
+    # Nudge times that fall just short of a minute onto it: the times on a minute then have fewer than
+    # 2 * _SECOND_EPSILON seconds.
+    time = time + _SECOND_EPSILON * u.s
+    if up:
+        # Times that are not on a minute are moved one minute (of SI seconds) forward and then truncated.
+        # This crosses a leap second correctly, which incrementing the minute field by hand would not.
+        time = time + np.where(time.ymdhms['second'] > 2 * _SECOND_EPSILON, 60.0, 0.0) * u.s
+    rounded = _truncate_minute(time)
+    rounded.format = 'iso'
+    return rounded
+
+
+def round_minute_jd(jd: npt.ArrayLike, up: bool = False) -> npt.NDArray[float]:
+    """Round Julian Date(s) down (truncate) or up to the nearest minute, without creating an astropy.Time.
+
+    This is meant for code that works with JDs internally: a single float JD has a precision of tens of
+    microseconds, so use round_minute for full precision. The JDs should be in a scale without leap seconds
+    (e.g. TAI or TT), since on a UTC day with a leap second multiples of 1/1440 day are not minute boundaries.
+
+    Args:
+        jd: Julian Date value(s) to round down/up
+        up: bool indicating whether to round up
+
+    Returns:
+        Round up/down Julian Date value(s)
     """
-    t = time.copy()
-    t.format = 'iso'
-    t.out_subfmt = 'date_hm'
+    minutes = np.asarray(jd, dtype=np.float64) * _MINUTES_PER_DAY
     if up:
-        sec = t.strftime('%S').astype(int)
-        idx = np.where(sec > 0)
-        t[idx] += 1.0 * u.min
-    return Time(t.iso, format='iso', scale='utc')
+        return np.ceil(minutes - _JD_MINUTE_EPSILON) / _MINUTES_PER_DAY
+    return np.floor(minutes + _JD_MINUTE_EPSILON) / _MINUTES_PER_DAY
 
 
 def str_to_bool(s: Optional[str]) -> bool:
@@ -121,6 +201,46 @@ def str_to_bool(s: Optional[str]) -> bool:
 # A dict of signs for conversion.
 SIGNS = {'': 1, '+': 1, '-': -1}
 
+# Conversion factors from degrees and hours to radians, computed once with the math module so that the scalar
+# conversions are a single float multiplication.
+_DEG_TO_RAD: Final[float] = math.pi / 180.0
+_HOUR_TO_RAD: Final[float] = math.pi / 12.0
+
+# Patterns for [sign]DD:MM:SS.sss and HH:MM:SS.sss strings.
+_DMS_PATTERN: Final[str] = r'([+-]?)(\d+):(\d+):(\d+(?:\.\d*)?|\.\d+)'
+_HMS_PATTERN: Final[str] = r'(\d+):(\d+):(\d+(?:\.\d*)?|\.\d+)'
+_DMS_RE = re.compile(_DMS_PATTERN)
+_HMS_RE = re.compile(_HMS_PATTERN)
+
+# The same patterns for a newline-separated block of strings, so that a whole array is validated in one match.
+_DMS_BLOCK_RE = re.compile(rf'(?:{_DMS_PATTERN}\n)*{_DMS_PATTERN}')
+_HMS_BLOCK_RE = re.compile(rf'(?:{_HMS_PATTERN}\n)*{_HMS_PATTERN}')
+
+
+def _parse_sexagesimal_array(strings: npt.ArrayLike,
+                             block_re: re.Pattern,
+                             parse: Callable[[str], float]) -> npt.NDArray[float]:
+    """Split an array of XX:MM:SS.sss strings into an (..., 3) array of its fields.
+
+    The strings are joined into a single block, validated with one match of block_re, and converted with a single
+    numpy parse. If the block does not match, each string is passed to parse to raise its ValueError.
+    """
+    arr = np.asarray(strings, dtype=np.str_)
+    if arr.size == 0:
+        return np.empty(arr.shape + (3,), dtype=np.float64)
+
+    items = arr.ravel().tolist()
+    block = '\n'.join(items)
+    fields = None
+    if block_re.fullmatch(block) is not None:
+        fields = np.fromstring(block.replace(':', ' '), sep=' ')
+    # A string with an embedded newline passes the block match but yields the wrong number of fields.
+    if fields is None or fields.size != 3 * arr.size:
+        for item in items:
+            parse(item)
+        raise ValueError(f'Illegal string in: {strings}')
+    return fields.reshape(arr.shape + (3,))
+
 
 def dmsstr2deg(s: str) -> float:
     """Degrees, minutes, seconds (in string form) to decimal degrees
@@ -135,18 +255,37 @@ def dmsstr2deg(s: str) -> float:
         float: value in decimal degrees
 
     """
-    if not s:
+    match = _DMS_RE.fullmatch(s)
+    if match is None:
         raise ValueError(f'Illegal DMS string: {s}')
+    sign, d, m, sec = match.groups()
+    # The sign has been validated by the pattern, so go straight to the compiled kernel.
+    if HAS_NUMBA:
+        return _dms2deg(int(d), int(m), float(sec), -1 if sign == '-' else 1)
+    # Without Numba, the kernel is a plain Python function and calling it costs more than its arithmetic.
+    dec = int(d) + int(m) / 60.0 + float(sec) / 3600.0
+    if sign == '-':
+        dec = -dec
+    return dec - 360.0 if dec >= 180.0 else dec
 
-    sign = '+'
-    if s[0] in SIGNS:
-        sign = s[0]
-        s = s[1:]
 
-    result = s.split(':')
-    if len(result) != 3:
-        raise ValueError(f'Illegal DMS string: {s}')
-    return dms2deg(int(result[0]), int(result[1]), float(result[2]), sign)
+def dmsstr2deg_array(strings: npt.ArrayLike) -> npt.NDArray[float]:
+    """Degrees, minutes, seconds (in string form) to decimal degrees, for an array of strings
+
+    Args:
+        strings: array-like of strings to convert
+
+    Raises:
+        ValueError: wrong format
+
+    Returns:
+        npt.NDArray[float]: values in decimal degrees, with the same shape as strings
+    """
+    fields = _parse_sexagesimal_array(strings, _DMS_BLOCK_RE, dmsstr2deg)
+    d, m, sec = fields[..., 0], fields[..., 1], fields[..., 2]
+    # The sign is carried by the degree field, including for -0 degrees.
+    dec = np.where(np.signbit(d), -1.0, 1.0) * (np.abs(d) + m / 60.0 + sec / 3600.0)
+    return np.where(dec >= 180.0, dec - 360.0, dec)
 
 
 def dms2deg(d: int, m: int, s: float, sign: str) -> float:
@@ -164,10 +303,10 @@ def dms2deg(d: int, m: int, s: float, sign: str) -> float:
     Returns:
         float: Decimal degrees value
     """
-    if sign not in SIGNS:
+    sign_int = SIGNS.get(sign)
+    if sign_int is None:
         raise ValueError(f'Illegal sign "{sign}" in DMS: {sign}{d}:{m}:{s}')
-    dec = SIGNS[sign] * (d + m / 60.0 + s / 3600.0)
-    return dec if dec < 180 else -(360 - dec)
+    return _dms2deg(d, m, s, sign_int)
 
 
 def dms2rad(d: int, m: int, s: float, sign: str) -> float:
@@ -185,7 +324,7 @@ def dms2rad(d: int, m: int, s: float, sign: str) -> float:
     Returns:
         float: Radian value
     """
-    return dms2deg(d, m, s, sign) * np.pi / 180.0
+    return dms2deg(d, m, s, sign) * _DEG_TO_RAD
 
 
 def hmsstr2deg(s: str) -> float:
@@ -200,14 +339,30 @@ def hmsstr2deg(s: str) -> float:
     Returns:
         float: Value in degrees
     """
-    if not s:
+    match = _HMS_RE.fullmatch(s)
+    if match is None:
         raise ValueError(f'Illegal HMS string: {s}')
+    h, m, sec = match.groups()
+    if HAS_NUMBA:
+        return _hms2deg(int(h), int(m), float(sec))
+    # Without Numba, the kernel is a plain Python function and calling it costs more than its arithmetic.
+    return int(h) + int(m) / 60.0 + float(sec) / 3600.0
 
-    result = s.split(':')
-    if len(result) != 3:
-        raise ValueError(f'Illegal HMS string: {s}')
 
-    return hms2deg(int(result[0]), int(result[1]), float(result[2]))
+def hmsstr2deg_array(strings: npt.ArrayLike) -> npt.NDArray[float]:
+    """HH:mm:ss in string to degrees, for an array of strings
+
+    Args:
+        strings: array-like of strings to convert
+
+    Raises:
+        ValueError: wrong format
+
+    Returns:
+        npt.NDArray[float]: values in degrees, with the same shape as strings
+    """
+    fields = _parse_sexagesimal_array(strings, _HMS_BLOCK_RE, hmsstr2deg)
+    return fields[..., 0] + fields[..., 1] / 60.0 + fields[..., 2] / 3600.0
 
 
 def hms2deg(h: int, m: int, s: float) -> float:
@@ -221,7 +376,7 @@ def hms2deg(h: int, m: int, s: float) -> float:
     Returns:
         float: Value in degrees
     """
-    return h + m / 60.0 + s / 3600.0
+    return _hms2deg(h, m, s)
 
 
 def hms2rad(h: int, m: int, s: float) -> float:
@@ -235,29 +390,134 @@ def hms2rad(h: int, m: int, s: float) -> float:
     Returns:
         float: Value in degrees
     """
-    return hms2deg(h, m, s) * np.pi / 12.
+    return hms2deg(h, m, s) * _HOUR_TO_RAD
+
+
+# Python and numpy scalar types that can take the scalar path of angular_distance.
+_SCALAR_TYPES = (int, float, np.integer, np.floating)
+
+
+def _to_radians(angle: npt.ArrayLike) -> npt.ArrayLike:
+    """Strip the units of an astropy Quantity (e.g. an Angle), converting it to radians: other values are
+    assumed to already be in radians and are returned unchanged.
+    """
+    return angle.to_value(u.rad) if isinstance(angle, u.Quantity) else angle
 
 
-def angular_distance(ra1: float, dec1: float, ra2: float, dec2: float) -> float:
+def _has_units(*angles: npt.ArrayLike) -> bool:
+    """Whether any of the angles is an astropy Quantity."""
+    return any(isinstance(angle, u.Quantity) for angle in angles)
+
+
+# numexpr is only worth its per-call overhead from this many distances on.
+_NUMEXPR_MIN_SIZE: Final[int] = 1024
+
+# The Vincenty formula of angular_distance, as a numexpr expression.
+_VINCENTY_NUMEXPR: Final[str] = (
+    'arctan2(sqrt((cos_dec2 * sin(ra2 - ra1)) ** 2 + '
+    '(cos_dec1 * sin_dec2 - sin_dec1 * cos_dec2 * cos(ra2 - ra1)) ** 2), '
+    'sin_dec1 * sin_dec2 + cos_dec1 * cos_dec2 * cos(ra2 - ra1))'
+)
+
+
+def angular_distance(ra1: npt.ArrayLike,
+                     dec1: npt.ArrayLike,
+                     ra2: npt.ArrayLike,
+                     dec2: npt.ArrayLike) -> Union[float, npt.NDArray[float]]:
     """Calculate the angular distance between two points on the sky.
     based on
     https://github.com/gemini-hlsw/lucuma-core/blob/master/modules/core/shared/src/main/scala/lucuma/core/math/Coordinates.scala#L52
 
+    The inputs may be scalars or arrays and are broadcast against each other, so the full pairwise
+    matrix of distances can be obtained with:
+        angular_distance(ra1[:, None], dec1[:, None], ra2[None, :], dec2[None, :])
+
+    Angles are in radians, or astropy Quantities (e.g. Angles). If any input is a Quantity, the result is a
+    Quantity in radians.
+
     Args:
-        ra1 (float): Right Ascension for point 1
-        dec1 (float): Declination for point 1
-        ra2 (float): Right Ascension for point 2
-        dec2 (float): Declination for point 2
+        ra1 (npt.ArrayLike): Right Ascension for point(s) 1
+        dec1 (npt.ArrayLike): Declination for point(s) 1
+        ra2 (npt.ArrayLike): Right Ascension for point(s) 2
+        dec2 (npt.ArrayLike): Declination for point(s) 2
 
     Returns:
-        float: Angular Distance
+        Union[float, npt.NDArray[float], u.Quantity]: Angular Distance(s) in radians, as a float if all the inputs
+        are plain scalars
     """
-    phi_1 = dec1
-    phi_2 = dec2
-    delta_phi = dec2 - dec1
-    delta_lambda = ra2 - ra1
-    a = np.sin(delta_phi / 2) ** 2 + np.cos(phi_1) * np.cos(phi_2) * np.sin(delta_lambda / 2) ** 2
-    return 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+    if (isinstance(ra1, u.Quantity) or isinstance(dec1, u.Quantity) or
+            isinstance(ra2, u.Quantity) or isinstance(dec2, u.Quantity)):
+        return _angular_distance(_to_radians(ra1), _to_radians(dec1), _to_radians(ra2), _to_radians(dec2)) * u.rad
+    return _angular_distance(ra1, dec1, ra2, dec2)
+
+
+def _angular_distance(ra1: npt.ArrayLike,
+                      dec1: npt.ArrayLike,
+                      ra2: npt.ArrayLike,
+                      dec2: npt.ArrayLike) -> Union[float, npt.NDArray[float]]:
+    """angular_distance for angles in radians without units."""
+    if (isinstance(ra1, _SCALAR_TYPES) and isinstance(dec1, _SCALAR_TYPES) and
+            isinstance(ra2, _SCALAR_TYPES) and isinstance(dec2, _SCALAR_TYPES)):
+        return _angular_distance_scalar(float(ra1), float(dec1), float(ra2), float(dec2))
+
+    ra1 = np.asarray(ra1, dtype=np.float64)
+    dec1 = np.asarray(dec1, dtype=np.float64)
+    ra2 = np.asarray(ra2, dtype=np.float64)
+    dec2 = np.asarray(dec2, dtype=np.float64)
+
+    # Vincenty formula for the great-circle distance, which (unlike the haversine) is numerically stable over the
+    # full range [0, π], i.e. both for very small separations and for near-antipodal points.
+    sin_dec1, cos_dec1 = np.sin(dec1), np.cos(dec1)
+    sin_dec2, cos_dec2 = np.sin(dec2), np.cos(dec2)
+
+    # For large inputs, numexpr evaluates the rest in one fused, multithreaded pass without temporary arrays.
+    # The declination terms are computed above so they are not re-evaluated for every pair when broadcasting.
+    if ne is not None and np.broadcast(ra1, dec1, ra2, dec2).size >= _NUMEXPR_MIN_SIZE:
+        return ne.evaluate(_VINCENTY_NUMEXPR)
+
+    delta_ra = ra2 - ra1
+    sin_delta_ra, cos_delta_ra = np.sin(delta_ra), np.cos(delta_ra)
+
+    num = np.hypot(cos_dec2 * sin_delta_ra, cos_dec1 * sin_dec2 - sin_dec1 * cos_dec2 * cos_delta_ra)
+    den = sin_dec1 * sin_dec2 + cos_dec1 * cos_dec2 * cos_delta_ra
+    result = np.arctan2(num, den)
+    return float(result) if result.ndim == 0 else result
+
+
+def _unit_vectors(ra: npt.ArrayLike, dec: npt.ArrayLike) -> npt.NDArray[float]:
+    """Convert points on the sky to Cartesian unit vectors, one row per point."""
+    ra = np.ravel(np.asarray(_to_radians(ra), dtype=np.float64))
+    dec = np.ravel(np.asarray(_to_radians(dec), dtype=np.float64))
+    cos_dec = np.cos(dec)
+    return np.stack([cos_dec * np.cos(ra), cos_dec * np.sin(ra), np.sin(dec)], axis=-1)
+
+
+def angular_distance_pairwise(ra1: npt.ArrayLike,
+                              dec1: npt.ArrayLike,
+                              ra2: npt.ArrayLike,
+                              dec2: npt.ArrayLike) -> npt.NDArray[float]:
+    """Calculate the angular distances between all pairs of two sets of points on the sky.
+
+    Each point is converted once to a unit vector, so the pairwise distances come from a single matrix product
+    instead of evaluating trigonometric functions for every pair. For separations below about 1e-7 radians the
+    result is less precise than angular_distance, as arccos is ill-conditioned near 0.
+
+    Angles are in radians, or astropy Quantities (e.g. Angles). If any input is a Quantity, the result is a
+    Quantity in radians.
+
+    Args:
+        ra1 (npt.ArrayLike): Right Ascensions for the n points of set 1
+        dec1 (npt.ArrayLike): Declinations for the n points of set 1
+        ra2 (npt.ArrayLike): Right Ascensions for the m points of set 2
+        dec2 (npt.ArrayLike): Declinations for the m points of set 2
+
+    Returns:
+        Union[npt.NDArray[float], u.Quantity]: An n x m array of the angular distances in radians
+    """
+    x = _unit_vectors(ra1, dec1)
+    y = _unit_vectors(ra2, dec2)
+    result = np.arccos(np.clip(x @ y.T, -1.0, 1.0))
+    return result * u.rad if _has_units(ra1, dec1, ra2, dec2) else result
 
 
 def lerp(first_value: float, last_value: float, n: int) -> npt.NDArray[float]:
@@ -277,6 +537,17 @@ def lerp(first_value: float, last_value: float, n: int) -> npt.NDArray[float]:
     return np.linspace(first_value, last_value, n + 2)[1:-1]
 
 
+@lru_cache(maxsize=None)
+def _sorted_enum_values(enum_class: Type[Enum]) -> npt.NDArray[float]:
+    """
+    Sort the values of an Enum of float. Enums are immutable, so this is cached per Enum class,
+    and the shared array is made read-only.
+    """
+    sorted_values = np.asarray(sorted(o.value for o in enum_class), dtype=np.float64)
+    sorted_values.flags.writeable = False
+    return sorted_values
+
+
 def lerp_enum(enum_class: Type[Enum], first_value: float, last_value: float, n: int) -> npt.NDArray[float]:
     """
     Given an Enum of float, a first_value, a last_value, and a number of slots, interpolate over the Enum
@@ -296,15 +567,16 @@ def lerp_enum(enum_class: Type[Enum], first_value: float, last_value: float, n:
     # and last values, which will be first_value and last_value.
     interp_values = np.linspace(first_value, last_value, n + 2)[1:-1]
 
-    # Sort the Enum values.
-    sorted_values = sorted(o.value for o in enum_class)
+    # SortedFloatEnums carry their sorted values: for other Enums, fall back to the cache.
+    sorted_values = getattr(enum_class, '_sorted_values_np', None)
+    if sorted_values is None:
+        sorted_values = _sorted_enum_values(enum_class)
 
-    # Interpolate over the Enum.
-    if first_value <= last_value:
-        result = [sorted_values[bisect.bisect_left(sorted_values, x)] for x in interp_values]
-    else:
-        result = [sorted_values[bisect.bisect_right(sorted_values, x)] for x in interp_values]
-    return np.array(result)
+    # Interpolate over the Enum: when ascending, take the smallest value >= x, and when descending, the smallest
+    # value > x. Indices past the end are clipped to the largest value.
+    side = 'left' if first_value <= last_value else 'right'
+    idx = np.searchsorted(sorted_values, interp_values, side=side)
+    return sorted_values[np.clip(idx, 0, len(sorted_values) - 1)]
 
 
 def _lerp_circular(first_value: float, last_value: float, n: int, max_val: float) -> npt.NDArray[float]:
@@ -0,0 +1,52 @@
+# Copyright (c) 2016-2024 Association of Universities for Research in Astronomy, Inc. (AURA)
+# For license information see LICENSE or https://opensource.org/licenses/BSD-3-Clause
+
+"""Scalar kernels for the coordinate helpers.
+
+   These are compiled with Numba when it is installed, and otherwise run as plain Python.
+   They use the math module rather than numpy so that Numba can lower them to direct libm calls.
+"""
+
+import math
+
+try:
+    from numba import njit
+    HAS_NUMBA = True
+except ImportError:
+    HAS_NUMBA = False
+
+    def njit(*_args, **_kwargs):  # type: ignore
+        """Stand-in for numba.njit when Numba is not available: returns the function unchanged."""
+        def decorator(func):  # type: ignore
+            return func
+        return decorator
+
+
+__all__ = [
+    'HAS_NUMBA',
+]
+
+
+@njit(cache=True, fastmath=True)
+def _dms2deg(d: int, m: int, s: float, sign_int: int) -> float:
+    dec = sign_int * (d + m / 60.0 + s / 3600.0)
+    return dec - 360.0 if dec >= 180.0 else dec
+
+
+@njit(cache=True, fastmath=True)
+def _hms2deg(h: int, m: int, s: float) -> float:
+    return h + m / 60.0 + s / 3600.0
+
+
+# No fastmath here: it allows reassociating the Vincenty terms, which costs precision for near-antipodal points.
+@njit(cache=True)
+def _angular_distance_scalar(ra1: float, dec1: float, ra2: float, dec2: float) -> float:
+    # Vincenty formula: see angular_distance.
+    delta_ra = ra2 - ra1
+    sin_dec1, cos_dec1 = math.sin(dec1), math.cos(dec1)
+    sin_dec2, cos_dec2 = math.sin(dec2), math.cos(dec2)
+    sin_delta_ra, cos_delta_ra = math.sin(delta_ra), math.cos(delta_ra)
+
+    num = math.hypot(cos_dec2 * sin_delta_ra, cos_dec1 * sin_dec2 - sin_dec1 * cos_dec2 * cos_delta_ra)
+    den = sin_dec1 * sin_dec2 + cos_dec1 * cos_dec2 * cos_delta_ra
+    return math.atan2(num, den)
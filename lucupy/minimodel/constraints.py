@@ -4,7 +4,7 @@
 from __future__ import annotations
 
 from dataclasses import dataclass, field
-from enum import Enum, IntEnum, auto
+from enum import IntEnum, auto
 from typing import ClassVar, List, Optional, Sequence, final
 
 import numpy as np
@@ -14,7 +14,7 @@ from astropy.units import Quantity
 from astropy import units as u
 
 from lucupy.helpers import flatten
-from lucupy.types import ScalarOrNDArray
+from lucupy.types import ScalarOrNDArray, SortedFloatEnum
 
 from ..decorators import immutable
 from .timingwindow import TimingWindow
@@ -34,7 +34,7 @@ __all__ = [
 
 
 @final
-class SkyBackground(float, Enum):
+class SkyBackground(SortedFloatEnum):
     """
     Bins for observation sky background requirements or current conditions.
 
@@ -52,7 +52,7 @@ class SkyBackground(float, Enum):
 
 
 @final
-class CloudCover(float, Enum):
+class CloudCover(SortedFloatEnum):
     """
     Bins for observation cloud cover requirements or current conditions.
 
@@ -69,7 +69,7 @@ class CloudCover(float, Enum):
 
 
 @final
-class ImageQuality(float, Enum):
+class ImageQuality(SortedFloatEnum):
     """
     Bins for observation image quality requirements or current conditions.
 
@@ -87,7 +87,7 @@ class ImageQuality(float, Enum):
 
 
 @final
-class WaterVapor(float, Enum):
+class WaterVapor(SortedFloatEnum):
     """
     Bins for observation water vapor requirements or current conditions.
 
@@ -105,7 +105,7 @@ class WaterVapor(float, Enum):
 
 
 @final
-class Strehl(float, Enum):
+class Strehl(SortedFloatEnum):
     """
     The Strehl ratio is a measure of the quality of optical image formation.
     Used variously in situations where optical resolution is compromised due to lens aberrations or due to imaging
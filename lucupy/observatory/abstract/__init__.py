@@ -4,7 +4,9 @@
 from __future__ import annotations
 
 from abc import ABC
-from typing import Optional, cast
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Final, Optional
 
 from astropy.time import Time
 
@@ -16,6 +18,13 @@ __all__ = [
     'ObservatoryProperties',
 ]
 
+_PROPERTIES_NOT_SET: Final[str] = 'Observatory properties have not been set.'
+
+# The properties set in the current context. Contexts that have not set any fall back to
+# ObservatoryProperties._properties, the properties set most recently in any context: for those contexts the last
+# setter wins, so e.g. threads scheduling North and South concurrently must each call set_properties themselves.
+_properties_var: ContextVar[ObservatoryProperties] = ContextVar('observatory_properties')
+
 
 class ObservatoryProperties(ABC):
     """Observatory-specific methods.
@@ -30,24 +39,21 @@ class ObservatoryProperties(ABC):
     def set_properties(cls) -> None:
         """Set properties for an specific Observatory
 
+        The properties are set for the current context (e.g. thread or asyncio task), which keeps them even if
+        another context sets different ones, and as the global default for contexts that have not set their own.
+        The global default is whatever was set last in any context, so a context relying on it can see it change
+        when another context calls set_properties: concurrent schedulers (e.g. for North and South) must each set
+        their own properties.
+
         Raises:
             ValueError: Illegal properties value.
 
         """
         if not issubclass(cls, ObservatoryProperties):
             raise ValueError('Illegal properties value.')
-        ObservatoryProperties._properties = cls()
-
-    @staticmethod
-    def _check() -> ObservatoryProperties:
-        """ Check if the properties have been set.
-
-        Raises:
-            ValueError: Properties have not been set.
-        """
-        if ObservatoryProperties._properties is None:
-            raise ValueError('Observatory properties have not been set.')
-        return cast(ObservatoryProperties, ObservatoryProperties._properties)
+        props = cls()
+        ObservatoryProperties._properties = props
+        _properties_var.set(props)
 
     @staticmethod
     def determine_standard_time(resources: Resources,
@@ -65,24 +71,23 @@ class ObservatoryProperties(ABC):
         Returns:
             Time: Value(s) of standard time
         """
-        return ObservatoryProperties._check().determine_standard_time(
-            resources,
-            wavelengths,
-            modes,
-            cal_length
-        )
+        props = _current_properties()
+        return props.determine_standard_time(resources, wavelengths, modes, cal_length)
 
     @staticmethod
     def nir_instruments() -> Resources:
-        return ObservatoryProperties._check().nir_instruments()
+        props = _current_properties()
+        return props.nir_instruments()
 
     @staticmethod
     def instruments() -> Resources:
-        return ObservatoryProperties._check().instruments()
+        props = _current_properties()
+        return props.instruments()
 
     @staticmethod
     def is_nir_instrument(resource: Resource) -> bool:
-        return ObservatoryProperties._check().is_nir_instrument(resource)
+        props = _current_properties()
+        return _is_nir_instrument_cached(props, resource)
 
     @staticmethod
     def is_instrument(resource: Resource) -> bool:
@@ -94,4 +99,27 @@ class ObservatoryProperties(ABC):
         Returns:
             bool: True is the resource is an instrument of the Observatory, otherwise False.
         """
-        return ObservatoryProperties._check().is_instrument(resource)
+        props = _current_properties()
+        return _is_instrument_cached(props, resource)
+
+
+def _current_properties() -> ObservatoryProperties:
+    """The properties of the current context, falling back to those set most recently in any context."""
+    props = _properties_var.get(None)
+    if props is None:
+        props = ObservatoryProperties._properties
+        if props is None:
+            raise ValueError(_PROPERTIES_NOT_SET)
+    return props
+
+
+# Resources are immutable flyweights, so the answers for given properties can be memoized.
+# The caches are keyed on the properties instance, so they need no invalidation when other properties are set.
+@lru_cache(maxsize=256)
+def _is_instrument_cached(props: ObservatoryProperties, resource: Resource) -> bool:
+    return props.is_instrument(resource)
+
+
+@lru_cache(maxsize=256)
+def _is_nir_instrument_cached(props: ObservatoryProperties, resource: Resource) -> bool:
+    return props.is_nir_instrument(resource)
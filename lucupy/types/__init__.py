@@ -3,8 +3,9 @@
 
 from datetime import timedelta
 from typing import Callable, Final, Generic, List, TypeAlias, TypeVar
-from enum import auto, Enum
+from enum import auto, Enum, EnumMeta
 
+import numpy as np
 import numpy.typing as npt
 from astropy.time import Time
 
@@ -40,4 +41,24 @@ class MinMax(Enum):
     Furthermore, it will always be the case that MIN < MAX, in case that is needed.
     '''
     MIN = auto()
-    MAX = auto()
\ No newline at end of file
+    MAX = auto()
+
+
+class _SortedFloatEnumMeta(EnumMeta):
+    """
+    Metaclass for SortedFloatEnum that stores the sorted member values once the members have been created.
+    This is done here rather than in __init_subclass__, which runs before the members exist in Python 3.10.
+    """
+    def __new__(metacls, cls, bases, classdict, **kwds):  # type: ignore
+        enum_class = super().__new__(metacls, cls, bases, classdict, **kwds)
+        sorted_values = np.asarray(sorted(m.value for m in enum_class), dtype=np.float64)
+        sorted_values.flags.writeable = False
+        enum_class._sorted_values_np = sorted_values
+        return enum_class
+
+
+class SortedFloatEnum(float, Enum, metaclass=_SortedFloatEnumMeta):
+    """
+    An Enum of floats whose sorted values are computed once, at class creation, as the read-only
+    numpy array _sorted_values_np. This lets lerp_enum interpolate over the Enum without sorting it.
+    """
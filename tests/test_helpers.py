@@ -1,15 +1,21 @@
 # Copyright (c) 2016-2024 Association of Universities for Research in Astronomy, Inc. (AURA)
 # For license information see LICENSE or https://opensource.org/licenses/BSD-3-Clause
 
+import math
 from datetime import timedelta
+from enum import Enum
 
 import astropy.units as u
 import numpy as np
 import pytest
-from astropy.time import TimeDelta
+from astropy.coordinates import Angle
+from astropy.time import Time, TimeDelta
 
-from lucupy.helpers import (is_contiguous, lerp, lerp_degrees, lerp_enum,
-                            lerp_radians, time_delta_astropy_to_minutes,
+from lucupy.helpers import (angular_distance, angular_distance_pairwise,
+                            dmsstr2deg, dmsstr2deg_array, flatten, hmsstr2deg,
+                            hmsstr2deg_array, is_contiguous, lerp, lerp_degrees,
+                            lerp_enum, lerp_radians, round_minute,
+                            round_minute_jd, time_delta_astropy_to_minutes,
                             timedelta_astropy_to_python)
 from lucupy.minimodel import CloudCover
 
@@ -33,6 +39,14 @@ def test_lerp_enum(first_value, last_value, n, expected):
     assert np.allclose(lerp_enum(CloudCover, first_value, last_value, n), expected)
 
 
+def test_lerp_enum_unsorted_enum():
+    # A plain Enum, declared out of order, takes the fallback path that sorts the values.
+    PlainCloudCover = Enum('PlainCloudCover', [('CCANY', 1.0), ('CC50', 0.5), ('CC80', 0.8), ('CC70', 0.7)])
+    for first_value, last_value in [(0.5, 1.0), (1.0, 0.5)]:
+        assert np.array_equal(lerp_enum(PlainCloudCover, first_value, last_value, 6),
+                              lerp_enum(CloudCover, first_value, last_value, 6))
+
+
 @pytest.mark.parametrize('first_value, last_value, n, expected',
                          [(np.pi/2, 3*np.pi/2, 4, np.array([0.9424778, 0.31415927, 5.96902604, 5.34070751])),
                           (np.pi/2, -np.pi/2, 4, np.array([0.9424778, 0.31415927, 5.96902604, 5.34070751])),
@@ -97,3 +111,206 @@ def test_time_delta_astropy_to_minutes(time_delta, expected):
                           (np.array([5, 4, 1]), False)])
 def test_is_contiguous(iterable, expected):
     assert is_contiguous(iterable) == expected
+
+
+@pytest.mark.parametrize('ra1, dec1, ra2, dec2, expected',
+                         [(0.0, 0.0, 0.0, 0.0, 0.0),
+                          (0.0, 0.0, np.pi / 2, 0.0, np.pi / 2),
+                          (0.0, -np.pi / 2, 0.0, np.pi / 2, np.pi),
+                          (1.0, 0.5, 1.0, 0.25, 0.25),
+                          (0.0, 0.0, 0.0, 1e-9, 1e-9),
+                          (0.0, 0.0, np.pi, 1e-9, np.pi - 1e-9),
+                          (0.0, 0.0, np.pi - 1e-7, 0.0, np.pi - 1e-7)])
+def test_angular_distance(ra1, dec1, ra2, dec2, expected):
+    # A tight relative tolerance: the haversine formula is off by about 1e-9 relative for near-antipodal points.
+    result = angular_distance(ra1, dec1, ra2, dec2)
+    assert isinstance(result, float)
+    assert math.isclose(result, expected, rel_tol=1e-12)
+
+
+def test_angular_distance_quantities():
+    distance = angular_distance(Angle(10 * u.deg), 0 * u.deg, Angle(20 * u.deg), 0 * u.deg)
+    assert isinstance(distance, u.Quantity)
+    assert u.isclose(distance, 10 * u.deg)
+    ra = Angle([0, 90, 180] * u.deg)
+    dec = np.zeros(3) * u.deg
+    distances = angular_distance(ra, dec, 0.0, 0.0)
+    assert distances.unit == u.rad
+    assert np.allclose(distances.value, [0, np.pi / 2, np.pi])
+    pairwise = angular_distance_pairwise(ra, dec, ra, dec)
+    assert pairwise.unit == u.rad
+    assert np.allclose(pairwise.value, angular_distance_pairwise(ra.radian, dec.value, ra.radian, dec.value))
+    assert not isinstance(angular_distance(0.1, 0.2, 0.3, 0.4), u.Quantity)
+    assert not isinstance(angular_distance_pairwise(ra.radian, dec.value, ra.radian, dec.value), u.Quantity)
+
+
+def test_numba_kernels_match_python():
+    pytest.importorskip('numba')
+    from lucupy.helpers import _jit
+    rng = np.random.default_rng(0)
+    ra1, ra2 = rng.uniform(0, 2 * np.pi, (2, 100))
+    dec1, dec2 = rng.uniform(-np.pi / 2, np.pi / 2, (2, 100))
+    ra1[0], dec1[0], ra2[0], dec2[0] = 0.0, 0.0, np.pi - 1e-9, 0.0
+    scalar = [_jit._angular_distance_scalar(*args) for args in zip(ra1.tolist(), dec1.tolist(),
+                                                                     ra2.tolist(), dec2.tolist())]
+    assert np.allclose(scalar, angular_distance(ra1, dec1, ra2, dec2), rtol=1e-12, atol=0)
+    assert math.isclose(_jit._dms2deg(10, 30, 36.5, -1), _jit._dms2deg.py_func(10, 30, 36.5, -1), rel_tol=1e-14)
+    assert math.isclose(_jit._hms2deg(12, 30, 36.5), _jit._hms2deg.py_func(12, 30, 36.5), rel_tol=1e-14)
+
+
+def test_angular_distance_pairwise_broadcast():
+    ra = np.array([0.0, np.pi / 2, np.pi])
+    dec = np.array([0.0, 0.0, 0.0])
+    result = angular_distance(ra[:, None], dec[:, None], ra[None, :], dec[None, :])
+    expected = np.array([[0.0, np.pi / 2, np.pi],
+                         [np.pi / 2, 0.0, np.pi / 2],
+                         [np.pi, np.pi / 2, 0.0]])
+    assert result.shape == (3, 3)
+    assert np.allclose(result, expected)
+
+
+def test_angular_distance_numexpr(monkeypatch):
+    # Covers the numexpr path, which is only taken when numexpr is installed, against the numpy path.
+    pytest.importorskip('numexpr')
+    rng = np.random.default_rng(7)
+    ra1, ra2 = rng.uniform(0, 2 * np.pi, (2, 40))
+    dec1, dec2 = rng.uniform(-np.pi / 2, np.pi / 2, (2, 40))
+    args = ra1[:, None], dec1[:, None], ra2[None, :], dec2[None, :]
+
+    result = angular_distance(*args)
+    monkeypatch.setattr('lucupy.helpers.ne', None)
+    expected = angular_distance(*args)
+    assert result.shape == (40, 40)
+    assert np.allclose(result, expected, rtol=1e-12, atol=0)
+
+
+def test_angular_distance_pairwise():
+    rng = np.random.default_rng(42)
+    ra1, ra2 = rng.uniform(0, 2 * np.pi, 5), rng.uniform(0, 2 * np.pi, 3)
+    dec1, dec2 = rng.uniform(-np.pi / 2, np.pi / 2, 5), rng.uniform(-np.pi / 2, np.pi / 2, 3)
+    result = angular_distance_pairwise(ra1, dec1, ra2, dec2)
+    expected = angular_distance(ra1[:, None], dec1[:, None], ra2[None, :], dec2[None, :])
+    assert result.shape == (5, 3)
+    assert np.allclose(result, expected)
+
+
+@pytest.mark.parametrize('iterable, expected',
+                         [([1, 2, [3, 4, 5], [[6, 7], 8, [9, 10]]], [1, 2, 3, 4, 5, 6, 7, 8, 9, 10]),
+                          ((1, 'ab', [b'cd', ()]), [1, 'ab', b'cd']),
+                          ([np.array([1, 2]), np.array([[3, 4], [5, 6]])], [1, 2, 3, 4, 5, 6]),
+                          (np.array([1.5, 2.5]), [1.5, 2.5]),
+                          ((x for x in [{1}, [2, (3,)]]), [1, 2, 3])])
+def test_flatten(iterable, expected):
+    assert list(flatten(iterable)) == expected
+
+
+def test_flatten_non_numeric_arrays():
+    dates = np.array([['2020-01-01', '2020-01-02']], dtype='M8[ns]')
+    result = list(flatten([dates]))
+    assert result == [np.datetime64('2020-01-01', 'ns'), np.datetime64('2020-01-02', 'ns')]
+    assert all(isinstance(d, np.datetime64) for d in result)
+
+
+def test_flatten_deep_nesting():
+    nested = [1]
+    for _ in range(5000):
+        nested = [nested]
+    assert list(flatten(nested)) == [1]
+
+
+@pytest.mark.parametrize('time, up, expected',
+                         [(Time('2023-01-01 12:00:00'), False, Time('2023-01-01 12:00:00')),
+                          (Time('2023-01-01 12:00:00'), True, Time('2023-01-01 12:00:00')),
+                          (Time('2023-01-01 12:00:45'), False, Time('2023-01-01 12:00:00')),
+                          (Time('2023-01-01 12:00:45'), True, Time('2023-01-01 12:01:00')),
+                          (Time('2024-02-29 23:59:01'), True, Time('2024-03-01 00:00:00')),
+                          (Time('2016-12-31 12:00:30'), False, Time('2016-12-31 12:00:00')),
+                          (Time('2016-12-31 12:00:30'), True, Time('2016-12-31 12:01:00')),
+                          (Time('2016-12-31 23:59:30'), True, Time('2017-01-01 00:00:00')),
+                          (Time('2016-12-31 23:59:60.5'), False, Time('2016-12-31 23:59:00')),
+                          (Time('2016-12-31 23:59:60.5'), True, Time('2017-01-01 00:00:00'))])
+def test_round_minute(time, up, expected):
+    assert round_minute(time, up).iso == expected.iso
+
+
+def test_round_minute_exact_minutes():
+    times = Time(['2023-01-01 00:00:00', '2016-12-31 00:00:00']) + np.arange(1440)[:, None] * u.min
+    assert np.all(round_minute(times).iso == times.iso)
+    assert np.all(round_minute(times, up=True).iso == times.iso)
+
+
+@pytest.mark.parametrize('times',
+                         [Time(60000 + np.arange(2000) / 1440, format='mjd'),
+                          Time(2460000.5 + np.arange(2000) / 1440, format='jd')])
+def test_round_minute_float_jd_minutes(times):
+    # Minutes built from a single float carry rounding errors of a few microseconds either way.
+    assert np.all(round_minute(times).iso == times.iso)
+    assert np.all(round_minute(times, up=True).iso == times.iso)
+    assert round_minute(Time(60000 + 2 / 1440, format='mjd')).iso == '2023-02-25 00:02:00.000'
+
+
+@pytest.mark.parametrize('s, expected',
+                         [('10:30:00', 10.5),
+                          ('+10:30:00', 10.5),
+                          ('-10:30:36.5', -(10 + 30 / 60 + 36.5 / 3600)),
+                          ('350:00:00', -10.0)])
+def test_dmsstr2deg(s, expected):
+    assert np.isclose(dmsstr2deg(s), expected)
+
+
+@pytest.mark.parametrize('s', ['', '10:30', '*10:30:00', 'a:b:c', '10:30:00:00'])
+def test_dmsstr2deg_exception(s):
+    with pytest.raises(ValueError):
+        dmsstr2deg(s)
+
+
+@pytest.mark.parametrize('s, expected',
+                         [('12:30:36', 12.51),
+                          ('00:00:00.0', 0.0)])
+def test_hmsstr2deg(s, expected):
+    assert np.isclose(hmsstr2deg(s), expected)
+
+
+@pytest.mark.parametrize('s', ['', '12:30', '-12:30:36', 'a:b:c'])
+def test_hmsstr2deg_exception(s):
+    with pytest.raises(ValueError):
+        hmsstr2deg(s)
+
+
+def test_dmsstr2deg_array():
+    strings = ['10:30:00', '+10:30:00', '-10:30:36.5', '350:00:00', '-0:30:00']
+    assert np.allclose(dmsstr2deg_array(strings), [dmsstr2deg(s) for s in strings])
+    assert dmsstr2deg_array([]).shape == (0,)
+
+
+@pytest.mark.parametrize('strings', [['10:30'], ['--10:30:00'], ['a:b:c'], ['10:30:00', '10:30'],
+                                     ['10.5:30:00'], ['10:-5:00'], [' 10:30:00'], ['10:30:00\n'],
+                                     ['10:30:1e2'], ['10:30:nan'], ['10:30:1.2.3'], ['10:30:.'],
+                                     ['10:30:00\n11:30:00']])
+def test_dmsstr2deg_array_exception(strings):
+    with pytest.raises(ValueError):
+        dmsstr2deg_array(strings)
+
+
+def test_hmsstr2deg_array():
+    strings = np.array([['12:30:36', '00:00:00.0'], ['23:59:59.9', '06:00:00']])
+    result = hmsstr2deg_array(strings)
+    assert result.shape == (2, 2)
+    assert np.allclose(result, np.vectorize(hmsstr2deg)(strings))
+
+
+@pytest.mark.parametrize('strings', [['12:30'], ['-12:30:36'], ['a:b:c'], ['12:-30:00'], ['12.5:30:00'],
+                                     [' 12:30:00'], ['12:30:00\n'], ['12:30:1e2'], ['12:30:nan']])
+def test_hmsstr2deg_array_exception(strings):
+    with pytest.raises(ValueError):
+        hmsstr2deg_array(strings)
+
+
+def test_round_minute_jd():
+    times = Time('2023-01-01 00:00:00') + np.arange(1440) * u.min
+    assert np.allclose(round_minute_jd(times.jd), times.jd, rtol=0, atol=1e-9)
+    assert np.allclose(round_minute_jd(times.jd, up=True), times.jd, rtol=0, atol=1e-9)
+
+    shifted = (times + 30 * u.s).jd
+    assert np.allclose(round_minute_jd(shifted), times.jd, rtol=0, atol=1e-9)
+    assert np.allclose(round_minute_jd(shifted, up=True), (times + 1 * u.min).jd, rtol=0, atol=1e-9)
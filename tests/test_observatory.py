@@ -0,0 +1,117 @@
+# Copyright (c) 2016-2024 Association of Universities for Research in Astronomy, Inc. (AURA)
+# For license information see LICENSE or https://opensource.org/licenses/BSD-3-Clause
+
+import contextvars
+import threading
+
+import pytest
+
+from lucupy.observatory.abstract import (ObservatoryProperties,
+                                        _is_nir_instrument_cached)
+from lucupy.observatory.gemini import GeminiProperties
+
+NIRI = GeminiProperties.Instruments.NIRI.value
+
+
+class NoNIRProperties(ObservatoryProperties):
+    """
+    Minimal properties that disagree with GeminiProperties on which instruments are NIR.
+    """
+    @staticmethod
+    def nir_instruments():
+        return frozenset()
+
+    @staticmethod
+    def is_nir_instrument(resource):
+        return False
+
+
+def run_in_thread(func):
+    """
+    Run func in a new thread, which starts with an empty context, and return its result.
+    """
+    result = []
+    thread = threading.Thread(target=lambda: result.append(func()))
+    thread.start()
+    thread.join()
+    return result[0]
+
+
+@pytest.fixture(autouse=True)
+def reset_properties():
+    """
+    The global properties are shared by all tests, so clear them around each test.
+    The context-level properties are only ever set in copied contexts or other threads.
+    """
+    ObservatoryProperties._properties = None
+    yield
+    ObservatoryProperties._properties = None
+
+
+@pytest.mark.parametrize('delegate, args',
+                         [(ObservatoryProperties.determine_standard_time, (frozenset(), [], frozenset(), 1)),
+                          (ObservatoryProperties.nir_instruments, ()),
+                          (ObservatoryProperties.instruments, ()),
+                          (ObservatoryProperties.is_nir_instrument, (NIRI,)),
+                          (ObservatoryProperties.is_instrument, (NIRI,))])
+def test_unset_properties_raise(delegate, args):
+    with pytest.raises(ValueError):
+        delegate(*args)
+
+
+def test_set_properties_illegal_value():
+    with pytest.raises(ValueError):
+        ObservatoryProperties.set_properties(object)
+
+
+def test_context_properties_do_not_leak():
+    def caller():
+        ObservatoryProperties.set_properties(GeminiProperties)
+
+        # Properties set in a copied context or in another thread stay there.
+        copied = contextvars.copy_context()
+        copied.run(ObservatoryProperties.set_properties, NoNIRProperties)
+        assert not copied.run(ObservatoryProperties.is_nir_instrument, NIRI)
+
+        def other_thread():
+            ObservatoryProperties.set_properties(NoNIRProperties)
+            return ObservatoryProperties.is_nir_instrument(NIRI)
+        assert not run_in_thread(other_thread)
+
+        # The caller still sees its own properties.
+        return ObservatoryProperties.is_nir_instrument(NIRI)
+
+    assert contextvars.copy_context().run(caller)
+
+
+def test_context_without_properties_falls_back_to_global():
+    contextvars.copy_context().run(ObservatoryProperties.set_properties, GeminiProperties)
+    assert run_in_thread(lambda: ObservatoryProperties.is_nir_instrument(NIRI))
+    assert ObservatoryProperties.nir_instruments() == GeminiProperties.nir_instruments()
+
+
+def test_global_fallback_is_last_setter_wins():
+    # A context without its own properties sees whichever were set most recently in any context.
+    contextvars.copy_context().run(ObservatoryProperties.set_properties, GeminiProperties)
+    assert ObservatoryProperties.is_nir_instrument(NIRI)
+    contextvars.copy_context().run(ObservatoryProperties.set_properties, NoNIRProperties)
+    assert not ObservatoryProperties.is_nir_instrument(NIRI)
+
+
+def test_is_nir_instrument_memoized():
+    def check():
+        ObservatoryProperties.set_properties(GeminiProperties)
+        before = _is_nir_instrument_cached.cache_info()
+        assert ObservatoryProperties.is_nir_instrument(NIRI)
+        assert ObservatoryProperties.is_nir_instrument(NIRI)
+        after = _is_nir_instrument_cached.cache_info()
+        assert after.misses - before.misses == 1
+        assert after.hits - before.hits == 1
+
+        # The memoized answer follows whichever properties are active.
+        ObservatoryProperties.set_properties(NoNIRProperties)
+        assert not ObservatoryProperties.is_nir_instrument(NIRI)
+        ObservatoryProperties.set_properties(GeminiProperties)
+        assert ObservatoryProperties.is_nir_instrument(NIRI)
+
+    contextvars.copy_context().run(check)